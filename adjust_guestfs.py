@@ -455,4 +455,5 @@ def main(argc: int, argv: list) -> int:
     return 1
 
 
-sys.exit(main(len(sys.argv), sys.argv))
+if (__name__ == "__main__"):
+    sys.exit(main(len(sys.argv), sys.argv))
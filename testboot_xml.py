@@ -34,17 +34,19 @@ from vmx2xml_mod.stopwatch import stopwatch_start, stopwatch_elapsed
 from vmx2xml_mod.runcmd import runcmd_detectv, runcmd
 
 program_version: str = "0.1"
+version_re: re.Pattern = re.compile(r"^(\d+\.\d+)", flags=re.MULTILINE)
+arping_version_re: re.Pattern = re.compile(r"^arping.*(\d+)$", flags=re.MULTILINE)
 
-def detect_virsh_version() -> float:
-    return runcmd_detectv(["virsh", "--version"], r"^(\d+\.\d+)", True)
+def detect_virsh_version() -> tuple:
+    return runcmd_detectv(["virsh", "--version"], version_re, True)
 
 
-def detect_virt_xml_version() -> float:
-    return runcmd_detectv(["virt-xml", "--version"], r"^(\d+\.\d+)", True)
+def detect_virt_xml_version() -> tuple:
+    return runcmd_detectv(["virt-xml", "--version"], version_re, True)
 
 
-def detect_arping_version() -> float:
-    return runcmd_detectv(["arping", "-V"], r"^arping.*(\d+)$", True)
+def detect_arping_version() -> tuple:
+    return runcmd_detectv(["arping", "-V"], arping_version_re, True)
 
 
 def virsh(params: list, check: bool) -> str:
@@ -0,0 +1,47 @@
+#! /usr/bin/env python3
+#
+# Copyright (c) 2024 SUSE LLC
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+# Tests for the guest adjustment submodule
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from vmx2xml_mod.adjust import adjust # pylint: disable=wrong-import-position
+
+
+# stands in for the adjust_guestfs.py module, failing like libguestfs does.
+class RaisingAdjustModule:
+    @staticmethod
+    def adjust_guestfs(*_args) -> bool:
+        raise RuntimeError("is_dir: call launch before using this function")
+
+
+class AdjustGuestfsPyTest(unittest.TestCase):
+    adj_actions: dict = {"drivers": True, "trim": False, "fstab": True, "net": False}
+
+    def test_exception_reported_as_failure(self) -> None:
+        with mock.patch.object(adjust, "adjust_guestfs_py_module", return_value=RaisingAdjustModule):
+            self.assertFalse(adjust.adjust_guestfs("disk.qcow2", True, "x", self.adj_actions, []))
+
+
+if (__name__ == "__main__"):
+    unittest.main()
@@ -27,37 +27,39 @@
 import sys
 import os
 import re
-import argparse
 from collections import defaultdict
-import shutil
-import filecmp
-import struct
+import concurrent.futures
+import functools
+import mmap
+import threading
 
-from vmx2xml_mod.log import log, log_init
+from vmx2xml_mod.log import log, logging, log_init
 from vmx2xml_mod.trace import trace_cmd_detect_version
 from vmx2xml_mod.adjust import adjust_guestfs_detect_version
 from vmx2xml_mod.inspector import inspector_detect_version, inspector_inspect
-from vmx2xml_mod.img import img_qemu_nbd_convert, img_qemu_convert, img_v2v_convert, img_file_ext
+from vmx2xml_mod.img import img_qemu_nbd_convert, img_qemu_convert, img_v2v_convert, img_file_ext, img_copy
 from vmx2xml_mod.stopwatch import stopwatch_start, stopwatch_elapsed
 from vmx2xml_mod.runcmd import runcmd, runcmd_detectv
 
 program_version: str = "0.1"
-
-
-# translate string using a passed dictionary
-def translate(dictionary: defaultdict, s: str) -> str:
-    if (s not in dictionary):
-        return ""
-    return dictionary[s]
-
-
+program_description: str = ("converts a VMX Virtual Machine definition into a libvirt XML domain file\n"
+                            "and optionally translates and converts datastores.\n")
+program_usage: str = "%(prog)s [options]\n"
+mac_address_re: re.Pattern = re.compile(r"^.*mac address.*(\w\w:\w\w:\w\w:\w\w:\w\w:\w\w).*$", flags=re.MULTILINE)
+vmx_line_re: re.Pattern = re.compile(rb"^[ \t]*([^#!=\s][^=\n]*)=(.*)$", flags=re.MULTILINE)
+vinst_version_re: re.Pattern = re.compile(r"^(\d+\.\d+)", flags=re.MULTILINE)
+qemu_img_version_re: re.Pattern = re.compile(r"^.*version (\d+\.\d+)", flags=re.MULTILINE)
+device_key_re: re.Pattern = re.compile(r"^(scsi|sata|ide|nvme|ethernet)(\d+)(?::(\d+))?\.(.+)$")
+
+
+# called for most VMX entries, with only a handful of distinct values.
+@functools.lru_cache(maxsize=16)
 def parse_boolean(s: str) -> bool:
-    s = s.lower()
-    return (s == "true")
+    return (s.lower() == "true")
 
 
 # parse a Reference to a filename in the VMX
-def parse_filename_ref(s: str, datastores: dict, translate_disk: bool, raw: bool) -> list:
+def parse_filename_ref(s: str, datastores: dict, translate_disk: bool, to_file_ext: str) -> list:
     # an empty string is valid, not really present.
     if (not s):
         return [None, None]
@@ -75,7 +77,7 @@ def parse_filename_ref(s: str, datastores: dict, translate_disk: bool, raw: bool
     # a relative path is relative to the VM directory
     if not (os.path.isabs(s)):
         log.debug("       looking in datastore '.' %s", datastores["."])
-        paths = find_file_ref(basename, datastores["."][0], datastores["."], False)
+        paths = list(find_file_ref(basename, datastores["."][0], datastores["."], False))
     if (not all(paths)):
         dirname: str = os.path.dirname(s)
         for ref in datastores:
@@ -83,28 +85,26 @@ def parse_filename_ref(s: str, datastores: dict, translate_disk: bool, raw: bool
             if (ref in (".", "..")):
                 continue
             log.debug("       looking in datastore %s", datastores[ref])
-            sourcedir = datastores[ref][0]
-            log.debug('       re.subn("^%s", "%s", "%s", count=1)', ref, sourcedir, dirname)
-            (match, n) = re.subn(f"^{ref}", sourcedir, dirname, count=1)
-            if (n == 1):
+            # the reference is a plain path prefix, no need for regular expressions here
+            if (dirname.startswith(ref)):
+                match: str = datastores[ref][0] + dirname[len(ref):]
                 log.debug('       [MATCH] %s', match)
-                paths = find_file_ref(basename, match, datastores[ref], True)
+                paths = list(find_file_ref(basename, match, datastores[ref], True))
                 break
             log.debug('       [NO MATCH]')
 
     # last fallback is to check this datastore
     if (not all(paths)):
         log.debug("       looking in datastore '..' %s", datastores[".."])
-        paths = find_file_ref(basename, datastores[".."][0], datastores[".."], False)
+        paths = list(find_file_ref(basename, datastores[".."][0], datastores[".."], False))
     if (not all(paths)):
         log.critical("       NOT FOUND, datastores %s", datastores)
         sys.exit(1)
 
     if (translate_disk):
-        to_file_ext: str = img_file_ext(raw)
-        (match, is_vmdk) = re.subn(r"\.vmdk$", f".{to_file_ext}", paths[1], count=1, flags=re.IGNORECASE)
-        if (is_vmdk == 1):
-            paths[1] = match
+        (base, ext) = os.path.splitext(paths[1])
+        if (ext.lower() == ".vmdk"):
+            paths[1] = f"{base}.{to_file_ext}"
 
     log.info("%s", paths)
     return paths
@@ -114,16 +114,13 @@ def parse_genid(genid: int, genidx: int) -> str:
     # e9392370-2917-565e-692b-d057f46512d6
     if (genid == 0 and genidx == 0):
         return ""
-    packed_num = struct.pack('>q', genid)
-    ugenid = struct.unpack('>Q', packed_num)[0]
-    packed_num = struct.pack('>q', genidx)
-    ugenidx = struct.unpack('>Q', packed_num)[0]
+    # the VMX stores the two halves as signed 64bit integers, reinterpret them as unsigned.
+    ugenid: int = genid & 0xFFFFFFFFFFFFFFFF
+    ugenidx: int = genidx & 0xFFFFFFFFFFFFFFFF
     s: str = f"{ugenidx:016x}{ugenid:016x}"
+    assert(len(s) == 32)
     # insert the - chars in the proper position
-    if (len(s) != 32):
-        log.warning('malformed GENID: "%s"', s)
-    result: str = s[0:8] + "-" + s[8:12] + "-" + s[12:16] + "-" + s[16:20] + "-" + s[20:32]
-    return result
+    return f"{s[0:8]}-{s[8:12]}-{s[12:16]}-{s[16:20]}-{s[20:32]}"
 
 
 def parse_vm_affinity(s: str) -> str:
@@ -133,16 +130,45 @@ def parse_vm_affinity(s: str) -> str:
     return s
 
 
+# index the files in the sourcepath tree by name, keeping the first one found for each name.
+# The tree is walked only once, however many disks are searched in it.
+# DirEntry caches the file type from readdir, avoiding most stat calls.
+@functools.lru_cache(maxsize=None)
+def walk_index(sourcepath: str) -> dict:
+    index: dict = {}
+    stack: list = [sourcepath]
+    visited: set = set()        # (st_dev, st_ino) of the directories walked, to not loop on symlinks
+    while (stack):
+        root: str = stack.pop()
+        try:
+            st = os.stat(root)
+            if ((st.st_dev, st.st_ino) in visited):
+                continue
+            visited.add((st.st_dev, st.st_ino))
+            it = os.scandir(root)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if (entry.is_file()):
+                        index.setdefault(entry.name, entry.path)
+                    elif (entry.is_dir()):
+                        stack.append(entry.path)
+                except OSError:
+                    continue
+    return index
+
+
+# search for the file name in the sourcepath tree.
 def walk_find(sourcepath: str, name: str) -> str:
-    for (root, _, files) in os.walk(sourcepath, followlinks=True):
-        for this in files:
-            if (this == name):
-                return os.path.join(root, name)
-    return ""
+    return walk_index(sourcepath).get(name, "")
 
 
-# find a file referred to by the VMX file
-def find_file_ref(name: str, match: str, datastore: tuple, recurse: bool) -> list:
+# find a file referred to by the VMX file. Returns a (sourcefile, targetfile) tuple.
+# Cached, as the same file can be referenced more than once (nvram, cdroms, floppies).
+@functools.lru_cache(maxsize=None)
+def find_file_ref(name: str, match: str, datastore: tuple, recurse: bool) -> tuple:
     sourcepath: str = match
     sourcefile: str = ""
     pathname: str = os.path.join(sourcepath, name)
@@ -151,162 +177,216 @@ def find_file_ref(name: str, match: str, datastore: tuple, recurse: bool) -> lis
     elif (recurse):
         sourcefile = walk_find(sourcepath, name)
     if (not sourcefile):
-        return [None, None]
+        return (None, None)
     log.debug("       find_file_ref sourcefile %s sourcepath %s pathname %s", sourcefile, sourcepath, pathname)
     targetfile: str = os.path.join(datastore[1], os.path.relpath(sourcefile, datastore[0]))
     log.debug("       find_file_ref targetfile %s", targetfile)
-    return [sourcefile, targetfile]
+    return (sourcefile, targetfile)
 
 
-def parse_vmx(f, d: defaultdict) -> None:
-    while (True):
-        line: str = f.readline()
-        if (line == ""):        # EOF
-            return
-        line = line.strip()
-        if (line == "" or line[0] == "#" or line[0] == "!"):
-            continue            # ignore
-        offset: int
-        try:
-            offset = line.index("=")
-        except:
-            offset = -1
-        if (offset < 0):
-            continue            # no =, malformed line
-        name: str = line[0:offset]
-        name = name.strip().lower()
+# scan the whole mapped file with a single regex. Comments (# and !) and lines without = are skipped.
+def parse_vmx(path: str, d: dict) -> None:
+    with open(path, 'rb') as f:
+        if (os.fstat(f.fileno()).st_size == 0):
+            return              # cannot map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for m in vmx_line_re.finditer(mm):
+                name: str = m.group(1).decode("utf-8").strip().lower()
+                # remove enclosing double quotes if any
+                d[name] = m.group(2).decode("utf-8").strip().strip('"')
+
 
-        value: str = line[offset + 1:]
-        value = value.strip()
-        value = value.strip('"') # remove enclosing double quotes if any
-        d[name] = value
+scsi_controller_models: dict = {
+    "":           "buslogic",
+    "auto":       "auto",
+    "lsilogic":   "lsilogic",
+    "lsisas1068": "lsisas1068",
+    "pvscsi":     "virtio-scsi"
+}
 
 
 def translate_scsi_controller_model(model: str) -> str:
-    translator: defaultdict = defaultdict(str, {
-        "":           "buslogic",
-        "auto":       "auto",
-        "lsilogic":   "lsilogic",
-        "lsisas1068": "lsisas1068",
-        "pvscsi":     "virtio-scsi"
-    })
-    return translate(translator, model)
+    return scsi_controller_models.get(model, "")
+
+
+# scan the VMX dictionary once, and index the device attributes by interface.
+# ctrl_attrs[interface][x][attr] for controllers and ethernet adapters,
+# disk_attrs[interface][(x, y)][attr] for disks.
+def index_device_attrs(d: dict) -> tuple:
+    ctrl_attrs: defaultdict = defaultdict(dict)
+    disk_attrs: defaultdict = defaultdict(dict)
+    for (name, value) in d.items():
+        m = device_key_re.match(name)
+        if (not m):
+            continue
+        (interface, x, y, attr) = m.groups()
+        if (y is None):
+            ctrl_attrs[interface].setdefault(int(x), {})[attr] = value
+        else:
+            disk_attrs[interface].setdefault((int(x), int(y)), {})[attr] = value
+    return (ctrl_attrs, disk_attrs)
+
+
+# find the controllers and disks of all interfaces in the index built by index_device_attrs.
+def find_all_disks(ctrl_attrs: dict, disk_attrs: dict, datastores: dict, disk_mode: str, to_file_ext: str) -> tuple:
+    # these interface names are used in vmware for disks
+    disk_ctrls: dict = {"scsi": {}, "sata": {}, "nvme": {}, "ide": {}}
+    disks: list = []
+    # the references are resolved serially on purpose: concurrent lookups would walk the same datastore
+    # trees at the same time, as the lookup caches do not coordinate threads, and mix up the lookup logs.
+    for interface in disk_ctrls:
+        disk_ctrls[interface] = find_disk_controllers(ctrl_attrs[interface], interface)
+        disks.extend(find_disks(disk_attrs[interface], datastores, interface,
+                                disk_ctrls[interface], disk_mode, to_file_ext))
+    return (disk_ctrls, disks)
 
 
-def find_disk_controllers(d: defaultdict, interface: str) -> dict:
+def find_disk_controllers(ctrl_attrs: dict, interface: str) -> dict:
     controllers: defaultdict = defaultdict(str)
-    for x in range(4):               # from "How Storage Controller Technology Works" VSphere7 docs
-        if not (parse_boolean(d[f"{interface}{x}.present"])):
+    for x in sorted(ctrl_attrs):
+        attrs: dict = ctrl_attrs[x]
+        if not (parse_boolean(attrs.get("present", ""))):
             continue
         model: str = ""
         if (interface == "scsi"):    # Only SCSI seems to have virtualdev
-            model = translate_scsi_controller_model(d[f"{interface}{x}.virtualdev"])
+            model = translate_scsi_controller_model(attrs.get("virtualdev", ""))
         controllers[x] = {"x": x, "model": model}
     return controllers
 
 
-def find_disks(d: defaultdict, datastores: dict, interface: str, controllers: dict, disk_mode: str, raw: bool) -> list:
+def find_disks(disk_attrs: dict, datastores: dict, interface: str, controllers: dict,
+               disk_mode: str, to_file_ext: str) -> list:
     disks: list = []
-    for x in range(4):
+    for (x, y) in sorted(disk_attrs):
         if (x not in controllers) and (interface != "ide"):  # IDE does not show explicit controllers entries
             continue
-        for y in range(30):           # max is from SATA ("How Storage Controller Technology Works" VSphere7)
-            if not (parse_boolean(d[f"{interface}{x}:{y}.present"])):
-                continue
-            if (interface == "ide"):  # insert IDE Controller
-                controllers[x] = {"x": x, "model": ""}
-            disk: dict = {
-                "bus": interface, "x": x, "y": y,
-                "device": '', "driver": '',
-                "cache": '', "path": [None, None],
-                "os": {"name": '', "osinfo": ''}
-            }
-            t: str = d[f"{interface}{x}:{y}.devicetype"].lower()
-            disk["device"] = "cdrom" if ("cdrom" in t) else "disk"
-            disk["path"] = parse_filename_ref(d[f"{interface}{x}:{y}.filename"], datastores, disk_mode != "none", raw)
-            #disk["driver"] = "block" if (disk["path"].startswith("/dev/")) else "file"
-            disk["driver"] = "file"
-            # XXX we never use the actual libvirt/qemu default, writeback?
-            disk["cache"] = "writethrough" if (parse_boolean(d[f"{interface}{x}:{y}.writethrough"])) else "none"
-            if (all(disk["path"]) and disk_mode == "convert" and disk["path"][0].endswith(".vmdk")):
-                log.info("[INSPECT] %s", os.path.basename(disk["path"][0]))
-                disk["os"] = inspector_inspect(disk["path"][0])
-                log.info("          %s", disk["os"])
-            disks.append(disk)
+        attrs: dict = disk_attrs[(x, y)]
+        if not (parse_boolean(attrs.get("present", ""))):
+            continue
+        if (interface == "ide"):  # insert IDE Controller
+            controllers[x] = {"x": x, "model": ""}
+        disk: dict = {
+            "bus": interface, "x": x, "y": y,
+            "device": '', "driver": '',
+            "cache": '', "path": [None, None],
+            "os": {"name": '', "osinfo": ''}
+        }
+        t: str = attrs.get("devicetype", "").lower()
+        disk["device"] = "cdrom" if ("cdrom" in t) else "disk"
+        disk["path"] = parse_filename_ref(attrs.get("filename", ""), datastores, disk_mode != "none", to_file_ext)
+        #disk["driver"] = "block" if (disk["path"].startswith("/dev/")) else "file"
+        disk["driver"] = "file"
+        # XXX we never use the actual libvirt/qemu default, writeback?
+        disk["cache"] = "writethrough" if (parse_boolean(attrs.get("writethrough", ""))) else "none"
+        disks.append(disk)
     return disks
 
 
-def find_sound(d: defaultdict) -> str:
-    translator: defaultdict = defaultdict(str, {
-        "": "default",
-        "es1371":  "es1370",
-        "hdaudio": "hda",
-        "sb16":    "sb16",
-    })
-    if not (parse_boolean(d["sound.present"])):
+# detect the OS of the VMDK disks. Each virt-inspector run takes seconds, so run them in parallel.
+def inspect_disks(disks: list) -> None:
+    paths: list = []
+    for disk in disks:
+        # ISOs and other cdrom images carry no OS to adjust, do not boot the appliance for them.
+        if (disk["device"] != "disk"):
+            continue
+        if (all(disk["path"]) and disk["path"][0].endswith(".vmdk") and disk["path"][0] not in paths):
+            paths.append(disk["path"][0])
+    if (not paths):
+        return
+    workers: int = min(8, os.cpu_count() or 1, len(paths))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results: dict = dict(zip(paths, executor.map(inspector_inspect, paths)))
+
+    for disk in disks:
+        if (disk["device"] == "disk" and disk["path"][0] in results):
+            log.info("[INSPECT] %s", os.path.basename(disk["path"][0]))
+            disk["os"] = dict(results[disk["path"][0]])
+            log.info("          %s", disk["os"])
+
+
+sound_models: dict = {
+    "": "default",
+    "es1371":  "es1370",
+    "hdaudio": "hda",
+    "sb16":    "sb16",
+}
+
+
+def find_sound(d: dict) -> str:
+    if not (parse_boolean(d.get("sound.present", ""))):
         return ""
-    if (parse_boolean(d["sound.autodetect"])):
+    if (parse_boolean(d.get("sound.autodetect", ""))):
         return "default"
-    return translate(translator, d["sound.virtualdev"])
+    return sound_models.get(d.get("sound.virtualdev", ""), "")
+
+
+eth_models: dict = {
+    "": "",            # default empty?
+    "vlance": "pcnet", # for old 32bit OSes (win98)
+    "e1000": "e1000",  # winxp, linux-2.4.19
+    "e1000e": "e1000e",  # windows 8, server 2012
+    "vmxnet": "virtio-net",   # convert PV to PV
+    "vmxnet2": "virtio-net",  # convert PV to PV
+    "vmxnet3": "virtio-net"   # convert PV to PV
+}
 
 
 def translate_eth_model(model: str) -> str:
-    translator: defaultdict = defaultdict(str, {
-        "": "",            # default empty?
-        "vlance": "pcnet", # for old 32bit OSes (win98)
-        "e1000": "e1000",  # winxp, linux-2.4.19
-        "e1000e": "e1000e",  # windows 8, server 2012
-        "vmxnet": "virtio-net",   # convert PV to PV
-        "vmxnet2": "virtio-net",  # convert PV to PV
-        "vmxnet3": "virtio-net"   # convert PV to PV
-    })
-    return translate(translator, model)
+    return eth_models.get(model, "")
+
+
+eth_types: dict = {
+    "": "",
+    "bridged": "bridged",
+    "vmnet0": "bridged",
+    "hostonly": "hostonly",
+    "vmnet1": "hostonly",
+    "nat": "nat",
+    "vmnet8": "nat",
+}
 
 
 def parse_eth_type(eth_type: str) -> str:
-    translator: defaultdict = defaultdict(str, {
-        "": "",
-        "bridged": "bridged",
-        "vmnet0": "bridged",
-        "hostonly": "hostonly",
-        "vmnet1": "hostonly",
-        "nat": "nat",
-        "vmnet8": "nat",
-    })
-    return translate(translator, eth_type)
+    return eth_types.get(eth_type, "")
+
+
+# default type mapping, hostonly maps to the sandbox network.
+eth_default_types: dict = {
+    "": "",
+    "bridged": "bridge",
+    "nat": "network=default",
+}
 
 
-# default type mapping
 def translate_eth_type(eth_type: str, sandbox: str) -> str:
-    translator: defaultdict = defaultdict(str, {
-        "": "",
-        "bridged": "bridge",
-        "hostonly": f"network={sandbox}",
-        "nat": "network=default",
-    })
-    return translate(translator, eth_type)
+    if (eth_type == "hostonly"):
+        return f"network={sandbox}"
+    return eth_default_types.get(eth_type, "")
+
+
+eth_address_types: dict = {
+    "": "",
+    "vpx": ".generatedaddress",
+    "generated": ".generatedaddress",
+    "static": ".address"
+}
 
 
 def translate_eth_address_type(addr_type: str) -> str:
-    translator: defaultdict = defaultdict(str, {
-        "": "",
-        "vpx": ".generatedaddress",
-        "generated": ".generatedaddress",
-        "static": ".address"
-    })
-    return translate(translator, addr_type)
+    return eth_address_types.get(addr_type, "")
 
 
-def find_eths(d: defaultdict, interface: str, networks: dict, sandbox: str) -> list:
+def find_eths(eth_attrs: dict, interface: str, networks: dict, sandbox: str) -> list:
     eths: list = []
-    for x in range(10):
-        if not (parse_boolean(d[f"{interface}{x}.present"])):
+    for x in sorted(eth_attrs):
+        attrs: dict = eth_attrs[x]
+        if not (parse_boolean(attrs.get("present", ""))):
             continue
         eth: defaultdict = defaultdict(str)
         s: str = f"{interface}{x}"
         eth["x"] = str(x) # XXX unused index XXX
-        eth_type: str = parse_eth_type(d[s + ".connectiontype"])
-        eth_name: str = d[s + ".networkname"]
+        eth_type: str = parse_eth_type(attrs.get("connectiontype", ""))
+        eth_name: str = attrs.get("networkname", "")
         onet: str = ""
 
         if (eth_name and networks["name"]):
@@ -326,46 +406,65 @@ def find_eths(d: defaultdict, interface: str, networks: dict, sandbox: str) -> l
             onet = "bridge"
 
         eth["type"] = onet
-        eth["model"] = translate_eth_model(d[s + ".virtualdev"])
-        addr_type: str = translate_eth_address_type(d[s + ".addresstype"])
+        eth["model"] = translate_eth_model(attrs.get("virtualdev", ""))
+        addr_type: str = translate_eth_address_type(attrs.get("addresstype", ""))
         if (addr_type):
-            eth["mac"] = d[s + addr_type]
+            eth["mac"] = attrs.get(addr_type[1:], "")
         else:
-            eth["mac"] = d[s + ".address"]
+            eth["mac"] = attrs.get("address", "")
             if not (eth["mac"]):
-                eth["mac"] = d[s + ".generatedaddress"]
+                eth["mac"] = attrs.get("generatedaddress", "")
         eth["addr_type"] = addr_type
         eths.append(eth)
     return eths
 
 ### emulation targets for disks and networks
 
+# disk_targets: dict = {
+#     "":           "",
+#     "scsi":       "virtio",
+#     "sata":       "virtio",
+#     "ide":        "ide",
+#     "nvme":       "virtio"
+# }
+#
 # def translate_disk_target(s: str) -> str:
-#     translator: defaultdict = defaultdict(str, {
-#         "":           "",
-#         "scsi":       "virtio",
-#         "sata":       "virtio",
-#         "ide":        "ide",
-#         "nvme":       "virtio"
-#     })
-#     return translate(translator, s);
+#     return disk_targets.get(s, "")
 
 
 # we need to create a pseudo disk for the virt install command to succeed (virt-install XXX)
+# Block device targets are never created: a missing one is expected to appear at runtime.
 def translate_check_path(tgtpath: str) -> str:
+    if (tgtpath.startswith("/dev/")):
+        if (not os.path.exists(tgtpath)):
+            log.warning("%s: block device target does not exist (yet)", tgtpath)
+        return tgtpath
     os.makedirs(os.path.dirname(tgtpath), exist_ok=True)
     if (not os.path.exists(tgtpath)):
         open(tgtpath, 'ab').close()
     return tgtpath
 
 
+# the allocated size is used, as the converted images are sparse.
 def print_throughput(elapsed: float, path: str) -> None:
-    if (elapsed > 0.0):
+    if (elapsed > 0.0 and log.isEnabledFor(logging.INFO)):
         targetstat = os.stat(path)
-        targetsize = targetstat.st_blocks * 512 // (1024 * 1024)
+        targetsize = (targetstat.st_blocks * 512) >> 20
         log.info("%s MiB in %s sec = %s MiB/s", targetsize, elapsed, targetsize // elapsed)
 
 
+# compare size and modification time, which the copy preserves with full resolution.
+# The nanoseconds are compared too: files differing within the same second must not be taken as the same.
+def is_same_file(srcpath: str, tgtpath: str) -> bool:
+    try:
+        srcstat = os.stat(srcpath)
+        tgtstat = os.stat(tgtpath)
+    except OSError:
+        log.info("could not compare to %s, assume we need to copy.", tgtpath)
+        return False
+    return (srcstat.st_size == tgtstat.st_size and srcstat.st_mtime_ns == tgtstat.st_mtime_ns)
+
+
 def convert_path(srcpath: str, tgtpath: str, disk_mode: str, raw: bool, conv_mode: str,
                  adj_mode: str, adj_actions: dict, macs: list, osd: dict,
                  trace_cmd: bool, cache_mode: str, numa_node: int, paral: int) -> None:
@@ -395,22 +494,30 @@ def convert_path(srcpath: str, tgtpath: str, disk_mode: str, raw: bool, conv_mod
         print_throughput(stopwatch_elapsed(), tgtpath)
 
     elif (tgtpath != srcpath):
-        try:
-            if (filecmp.cmp(srcpath, tgtpath, shallow=True)):
-                log.info("disk already found at %s, no need to copy.", tgtpath)
-                return
-        except:
-            log.info("could not compare to %s, assume we need to copy.", tgtpath)
+        if (is_same_file(srcpath, tgtpath)):
+            log.info("disk already found at %s, no need to copy.", tgtpath)
+            return
 
         log.info("copying non-VMDK disk %s", tgtpath)
         stopwatch_start()
-        # use copy2 so we try to preserve modification time.
-        shutil.copy2(srcpath, tgtpath)
+        img_copy(srcpath, tgtpath)
         print_throughput(stopwatch_elapsed(), tgtpath)
 
 
+# run convert_path from the conversion pool, unless another conversion already failed:
+# a disk already picked up by a worker cannot be cancelled anymore, but it does not need to be converted.
+def convert_path_unless_failed(failed: threading.Event, *args) -> None:
+    if (failed.is_set()):
+        return
+    try:
+        convert_path(*args)
+    except BaseException:
+        failed.set()
+        raise
+
+
 # run virt-install and return the generated XML as a string
-def virt_install(vinst_version: float,
+def virt_install(vinst_version: tuple,
                  xml_name: str, fidelity: bool, skip_extra: bool,
                  displayname: str, annotation: str,
                  cpu: dict, memory: int,
@@ -424,10 +531,10 @@ def virt_install(vinst_version: float,
                  eths: list) -> str:
     ### GENERAL SECTION - General Options for selecting the main functionality ###
     args: list = ["virt-install", "--print-xml", "--dry-run", "--noautoconsole", "--check", "all=off"]
-    args.extend(["--virt-type", "kvm"])
+    args += ("--virt-type", "kvm")
 
     # for Windows 2012, "PC" is necessary to boot, with legacy BIOS.
-    args.extend(["--machine", "q35" if (uefi) else "pc"])
+    args += ("--machine", "q35" if (uefi) else "pc")
 
     # Starting with virt-install 4.0.0 providing osinfo is REQUIRED which breaks scripts,
     # and especially unfriendly with our import use case.
@@ -435,57 +542,57 @@ def virt_install(vinst_version: float,
     # but it emits a warning. Disable the check explicitly via cmdline option instead.
     # sub_env = os.environ.copy()
     # sub_env["VIRTINSTALL_OSINFO_DISABLE_REQUIRE"] = "1"
-    if (vinst_version >= 4.0):
-        args.extend(["--os-variant", "detect=on,require=off"])
+    if (vinst_version >= (4, 0)):
+        args += ("--os-variant", "detect=on,require=off")
 
     ### MAIN VM INFO SECTION - Fundamental VM Options are set here ###
-    (domainname, n) = re.subn(r"\.xml$", "", os.path.basename(xml_name), count=1, flags=re.IGNORECASE)
-    if (n != 1):
+    (domainname, ext) = os.path.splitext(os.path.basename(xml_name))
+    if (ext.lower() != ".xml"):
         log.critical("invalid xml name %s, does not end in .xml", xml_name)
         sys.exit(1)
-    args.extend(["--name", domainname])
+    args += ("--name", domainname)
     if (displayname):
-        args.extend(["--metadata", f"title={displayname}"])
+        args += ("--metadata", f"title={displayname}")
     if (annotation):
-        args.extend(["--metadata", f"description={annotation}"])
+        args += ("--metadata", f"description={annotation}")
     assert(memory > 0)
-    args.extend(["--memory", f"{memory}"])
+    args += ("--memory", f"{memory}")
     assert(cpu["model"])
 
     cpu_str: str = cpu["model"]
-    if (vinst_version >= 4.0 and cpu["model"] == "host-passthrough"):
+    if (vinst_version >= (4, 0) and cpu["model"] == "host-passthrough"):
         cpu_str += ",check=none,migratable=on"
-    args.extend(["--cpu", cpu_str])
+    args += ("--cpu", cpu_str)
 
     assert(vcpus > 0 and sockets > 0 and cores > 0 and threads > 0)
     vcpu_str = f"{vcpus},sockets={sockets},cores={cores},threads={threads}"
     if (fidelity and vm_affinity):
         vcpu_str += f",cpuset={vm_affinity}"
-    args.extend(["--vcpus", vcpu_str])
+    args += ("--vcpus", vcpu_str)
     assert(iothreads > 0)
-    args.extend(["--iothreads", f"{iothreads}"])
+    args += ("--iothreads", f"{iothreads}")
 
     # we add a watchdog, but we do not want to reset directly, instead we expect to capture the relative libvirt events
     # and take appropriate action in the HA function
-    args.extend(["--watchdog", "i6300esb,action=none"])
+    args += ("--watchdog", "i6300esb,action=none")
 
     ### FIRMWARE and BOOT SECTION - BIOS, UEFI, etc ###
     if (uefi):
-        args.extend(["--boot", f"{uefi}"])
+        args += ("--boot", f"{uefi}")
 
     ### XXX not safe, removed to avoid destroying nvram XXX ###
     ### we'd need to convert from the VMWare nvram format ###
     #
     #if (nvram):
-    #    args.extend(["--boot", f"nvram={nvram}"])
+    #    args += ("--boot", f"nvram={nvram}")
 
     if (genid):
-        args.extend(["--metadata", f"genid={genid}"])
+        args += ("--metadata", f"genid={genid}")
     if (sysinfo):
-        args.extend(["--sysinfo", sysinfo])
+        args += ("--sysinfo", sysinfo)
 
     ### MULTIMEDIA SECTION - display, graphics, sound ###
-    args.extend(["--graphics", "vnc"])
+    args += ("--graphics", "vnc")
 
     args.append("--video")
 
@@ -497,13 +604,13 @@ def virt_install(vinst_version: float,
         args.append("model.type=none")
 
     if (sound):
-        args.extend(["--sound", f"model={sound}"])
+        args += ("--sound", f"model={sound}")
 
     ### EVENTS SECTION ###
-    args.extend(["--events", "on_crash=restart"])
+    args += ("--events", "on_crash=restart")
 
     ### DISKS AND CONTROLLERS SECTION ###
-    s: str; model: str; device: str; driver: str; path: str
+    opts: list; model: str; device: str; driver: str; path: str
     if (fidelity):
         # only in fidelity mode we explicitly add controllers as present in the original config file,
         # only translating VMWare PV to Virtio PV (pvscsi to virtio-scsi).
@@ -520,11 +627,11 @@ def virt_install(vinst_version: float,
             ctrls: dict = disk_ctrls[interface]
             for index in ctrls:
                 ctrl = ctrls[index]
-                s = f"type={interface},index={index}"
+                opts = [f"type={interface}", f"index={index}"]
                 model = ctrl["model"]
                 if (model):
-                    s += f",model={model}"
-                args.extend(["--controller", s])
+                    opts.append(f"model={model}")
+                args += ("--controller", ",".join(opts))
 
     for disk in disks:
         _x: int = disk["x"]
@@ -543,15 +650,15 @@ def virt_install(vinst_version: float,
             target = "virtio" if (bus == "nvme") else bus
         else:
             target = "virtio"
-        s = f"device={device},path={path},target.bus={target},driver.cache={cache}"
+        opts = [f"device={device}", f"path={path}", f"target.bus={target}", f"driver.cache={cache}"]
         # XXX workaround for virt-install bug https://github.com/virt-manager/virt-manager/issues/407
         (_, ext) = os.path.splitext(path)
         if (ext[0] == '.'):
             ext = ext[1:]
-            s += f",driver.type={ext}"
-        if (vinst_version >= 3.0):
-            s += f",type={driver}"
-        args.extend(["--disk", s])
+            opts.append(f"driver.type={ext}")
+        if (vinst_version >= (3, 0)):
+            opts.append(f"type={driver}")
+        args += ("--disk", ",".join(opts))
 
     for paths in floppys:
         if not all(paths):
@@ -560,37 +667,37 @@ def virt_install(vinst_version: float,
         path = paths[1]
         driver = "file"
 
-        s = f"device={device},path={path}"
-        if (vinst_version >= 3.0):
-            s += f",type={driver}"
-        args.extend(["--disk", s])
+        opts = [f"device={device}", f"path={path}"]
+        if (vinst_version >= (3, 0)):
+            opts.append(f"type={driver}")
+        args += ("--disk", ",".join(opts))
 
     if not disks and not floppys[0] and not floppys[1]:
-        args.extend(["--disk", "none"])
+        args += ("--disk", "none")
 
     ### NETWORKS ###
 
     for eth in eths:
-        s = eth["type"]
+        opts = [eth["type"]]
         model = eth["model"]
         mac: str = eth["mac"]
         if not (fidelity and model):
             model = "virtio-net"
-        s += f",model={model}"
+        opts.append(f"model={model}")
         if (mac and eth["addr_type"] == ".address"):
-            s += f",mac={mac}"
-        args.extend(["--network", s])
+            opts.append(f"mac={mac}")
+        args += ("--network", ",".join(opts))
 
     ### COMMUNICATIONS, GUEST-AGENT ###
-    #args.extend(["--vsock", "cid.auto=yes"])
-    args.extend(["--controller", "type=virtio-serial,model=virtio"])
-    args.extend(["--channel", "unix,mode=bind,target_type=virtio,name=org.qemu.guest_agent.0"])
+    #args += ("--vsock", "cid.auto=yes")
+    args += ("--controller", "type=virtio-serial,model=virtio")
+    args += ("--channel", "unix,mode=bind,target_type=virtio,name=org.qemu.guest_agent.0")
     # allow copypaste to work (XXX does not really work for me XXX)
-    args.extend(["--channel", "qemu-vdagent,source.clipboard.copypaste=on,target.type=virtio"])
+    args += ("--channel", "qemu-vdagent,source.clipboard.copypaste=on,target.type=virtio")
 
     ### MISCELLANEOUS DEVICES ###
-    args.extend(["--rng", "/dev/urandom"])
-    args.extend(["--memballoon", "none"])
+    args += ("--rng", "/dev/urandom")
+    args += ("--memballoon", "none")
 
     ### CREATE THE DOMAIN XML STRING ###
     xml: str = runcmd(args, True)
@@ -601,19 +708,21 @@ def virt_install(vinst_version: float,
     return xml
 
 
-# detect virt-install version only considering major.minor
-def detect_vinst_version() -> float:
-    v: float = runcmd_detectv(["virt-install", "--version"], r"^(\d+\.\d+)", True)
-    if (v < 2.2):
+# detect virt-install version only considering major.minor.
+# Cached, so that converting several VMs in one process only probes it once.
+@functools.lru_cache(maxsize=1)
+def detect_vinst_version() -> tuple:
+    v: tuple = runcmd_detectv(["virt-install", "--version"], vinst_version_re, True)
+    if (v < (2, 2)):
         log.critical("virt-install version >= 2.2.0 is required for this command to work")
         sys.exit(1)
-    if (v < 4.0):
+    if (v < (4, 0)):
         log.warning("virt-install version >= 4.0.0 is recommended for best results")
     return v
 
 
-def detect_qemu_img_version() -> float:
-    return runcmd_detectv(["qemu-img", "--version"], r"^.*version (\d+\.\d+)", True)
+def detect_qemu_img_version() -> tuple:
+    return runcmd_detectv(["qemu-img", "--version"], qemu_img_version_re, True)
 
 
 def is_dir(string: str) -> bool:
@@ -740,20 +849,16 @@ def help_conversion() -> None:
     sys.exit(0)
 
 
-def get_options(_argc: int, _argv: list) -> tuple:
+# the parser does not depend on the arguments, so build it only once.
+@functools.lru_cache(maxsize=None)
+def get_options_parser() -> "argparse.ArgumentParser":
+    # only needed when run as a program, do not pay for the import otherwise.
+    import argparse # pylint: disable=import-outside-toplevel
     cache_modes: list = ["none", "writeback", "unsafe", "directsync", "writethrough"]
-    _disk_modes: list = ["none", "translate", "convert"]
-    _conv_modes: list = ["v2v", "x", "y"]
-    conv_mode: str = "v2v"
-    _adj_modes: list = ["none", "v2v", "x"]
-    adj_mode: str = "v2v"
-    adj_actions: dict = {"drivers": False, "trim": False, "fstab": False, "net": False}
-
     parser: argparse.ArgumentParser = argparse.ArgumentParser(
         prog='vmx2xml.py',
-        description="converts a VMX Virtual Machine definition into a libvirt XML domain file\n"
-        "and optionally translates and converts datastores.\n",
-        usage="%(prog)s [options]\n"
+        description=program_description,
+        usage=program_usage
     )
     parser.add_argument('--help-datastores', action='store_true',
                         help='display additional help text about datastore mappings')
@@ -796,6 +901,9 @@ def get_options(_argc: int, _argv: list) -> tuple:
                           help='generate .raw references and disks instead of the default .qcow2')
     diskmode.add_argument('-X', '--skip-extra', action='store_true',
                           help='skip extra non-OS VMDK/qcow2 disks. Useful for the boot test only.')
+    diskmode.add_argument('-P', '--parallel-disks', action='store', type=int, default=1,
+                          help='convert up to this many disks at the same time (default 1). '
+                          'virt-v2v conversions and traced (-W) conversions always run one at a time')
 
     convmode = parser.add_argument_group('VMDK DISK CONVERSION OPTIONS', 'how to convert the VMDK disks, '
                                          'see also --help-conversion')
@@ -825,8 +933,18 @@ def get_options(_argc: int, _argv: list) -> tuple:
                           help='enable x-adjustment of /etc/fstab to mount with option "nofail".')
     advanced.add_argument('-M', '--adjust-networks', action='store_true',
                           help='enable x-adjustment of guest network configuration.')
+    return parser
 
-    args: argparse.Namespace = parser.parse_args()
+
+def get_options(_argc: int, argv: list) -> tuple:
+    _disk_modes: list = ["none", "translate", "convert"]
+    _conv_modes: list = ["v2v", "x", "y"]
+    conv_mode: str = "v2v"
+    _adj_modes: list = ["none", "v2v", "x"]
+    adj_mode: str = "v2v"
+    adj_actions: dict = {"drivers": False, "trim": False, "fstab": False, "net": False}
+
+    args = get_options_parser().parse_args(argv[1:])
     if (args.verbose and args.quiet):
         log.critical("cannot specify both --verbose and --quiet at the same time.")
         sys.exit(1)
@@ -880,49 +998,51 @@ def get_options(_argc: int, _argv: list) -> tuple:
     fidelity: bool = args.fidelity
     trace_cmd: bool = args.trace_cmd
     cache_mode: str = args.cache_mode
-    vmxdir: str = os.path.dirname(os.path.abspath(vmx_name))
-    xmldir: str = os.path.dirname(os.path.abspath(xml_name))
+    # same as os.path.abspath, but only get the current directory once.
+    cwd: str = os.getcwd()
+    vmxdir: str = os.path.dirname(os.path.normpath(os.path.join(cwd, vmx_name)))
+    xmldir: str = os.path.dirname(os.path.normpath(os.path.join(cwd, xml_name)))
     os.makedirs(xmldir, exist_ok=True)
     numa_node: int = args.numa_node
     parallel: int = args.parallel
+    parallel_disks: int = max(args.parallel_disks, 1)
 
     datastores: defaultdict = defaultdict(str, {
         ".": (vmxdir, xmldir),
         "..": (os.path.dirname(vmxdir), os.path.dirname(xmldir))
     })
 
-    if (args.datastore):
-        for i in range(0, len(args.datastore)):
-            (fro, match_eq, targetpath) = args.datastore[i].partition("=")
-            (ref, match_cm, sourcepath) = fro.partition(",")
-            if (not match_cm):
-                sourcepath = ref
-            if (not match_eq):
-                targetpath = sourcepath
-            datastores[ref] = (sourcepath, targetpath)
+    for datastore in (args.datastore or ()):
+        (fro, match_eq, targetpath) = datastore.partition("=")
+        (ref, match_cm, sourcepath) = fro.partition(",")
+        if (not match_cm):
+            sourcepath = ref
+        if (not match_eq):
+            targetpath = sourcepath
+        datastores[ref] = (sourcepath, targetpath)
 
     networks: defaultdict = defaultdict(str, {"name": {}, "type": {}})
-    if (args.network):
-        for i in range(0, len(args.network)):
-            (inet, match_eq, onet) = args.network[i].partition("=")
-            (prefix, match_cl, netinet) = inet.partition(":")
-            if (not match_cl):
-                prefix = "name"
-                netinet = inet
-            if (prefix not in ("name", "type")):
-                log.critical('invalid network map prefix "%s"', prefix)
-                sys.exit(1)
-            networks[prefix][netinet] = onet
+    for network in (args.network or ()):
+        (inet, match_eq, onet) = network.partition("=")
+        (prefix, match_cl, netinet) = inet.partition(":")
+        if (not match_cl):
+            prefix = "name"
+            netinet = inet
+        if (prefix not in ("name", "type")):
+            log.critical('invalid network map prefix "%s"', prefix)
+            sys.exit(1)
+        networks[prefix][netinet] = onet
 
     disk_mode: str = "convert" if (args.convert_disks) else "translate" if (args.translate_disks) else "none"
     overwrite: bool = args.overwrite
 
-    log.debug("[OPTIONS] vmx_name=%s xml_name=%s overwrite:%s fidelity:%s "
-              "disk_mode:%s raw:%s skip_extra:%s datastores:%s networks:%s sandbox:%s conv_mode:%s "
-              "adj_mode:%s adj_actions:%s trace_cmd:%s cache_mode:%s numa_node:%s parallel:%s",
-              vmx_name, xml_name, overwrite, fidelity,
-              disk_mode, args.raw, args.skip_extra, datastores, networks, args.sandbox, conv_mode,
-              adj_mode, adj_actions, trace_cmd, cache_mode, numa_node, parallel)
+    if (log.isEnabledFor(logging.DEBUG)):
+        log.debug("[OPTIONS] vmx_name=%s xml_name=%s overwrite:%s fidelity:%s "
+                  "disk_mode:%s raw:%s skip_extra:%s datastores:%s networks:%s sandbox:%s conv_mode:%s "
+                  "adj_mode:%s adj_actions:%s trace_cmd:%s cache_mode:%s numa_node:%s parallel:%s parallel_disks:%s",
+                  vmx_name, xml_name, overwrite, fidelity,
+                  disk_mode, args.raw, args.skip_extra, datastores, networks, args.sandbox, conv_mode,
+                  adj_mode, adj_actions, trace_cmd, cache_mode, numa_node, parallel, parallel_disks)
 
     if (os.path.exists(xml_name)):
         if (not overwrite):
@@ -936,52 +1056,58 @@ def get_options(_argc: int, _argv: list) -> tuple:
 
     return (vmx_name, xml_name, fidelity,
             disk_mode, args.raw, args.skip_extra, datastores, networks, args.sandbox, conv_mode,
-            adj_mode, adj_actions, trace_cmd, cache_mode, numa_node, parallel)
+            adj_mode, adj_actions, trace_cmd, cache_mode, numa_node, parallel, parallel_disks)
 
 
 def main(argc: int, argv: list) -> int:
     (vmx_name, xml_name, fidelity,
      disk_mode, raw, skip_extra, datastores, networks, sandbox, conv_mode,
-     adj_mode, adj_actions, trace_cmd, cache_mode, numa_node, parallel) = get_options(argc, argv)
-
-    vinst_version: float = detect_vinst_version()
-    _ = inspector_detect_version()
-    _ = adjust_guestfs_detect_version()
-    _ = detect_qemu_img_version()
-    trace_cmd_version: float = trace_cmd_detect_version()
-    if (trace_cmd and trace_cmd_version < 2.7):
+     adj_mode, adj_actions, trace_cmd, cache_mode, numa_node, parallel, parallel_disks) = get_options(argc, argv)
+
+    # the version probes just wait for their child processes, so run them concurrently.
+    # adjust_guestfs.py and trace-cmd are only probed when they are going to be used.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        fvinst = executor.submit(detect_vinst_version)
+        finspector = executor.submit(inspector_detect_version)
+        fadjust = executor.submit(adjust_guestfs_detect_version) if (adj_mode == "x") else None
+        fqemu_img = executor.submit(detect_qemu_img_version)
+        ftrace_cmd = executor.submit(trace_cmd_detect_version) if (trace_cmd) else None
+    vinst_version: tuple = fvinst.result()
+    _ = finspector.result()
+    _ = fadjust.result() if (fadjust) else ()
+    _ = fqemu_img.result()
+    trace_cmd_version: tuple = ftrace_cmd.result() if (ftrace_cmd) else ()
+    if (trace_cmd and trace_cmd_version < (2, 7)):
         log.critical("trace-cmd functionality requested, but trace-cmd >= 2.7 NOT FOUND")
         sys.exit(1)
 
-    vmx_file = open(vmx_name, 'r', encoding="utf-8")
-    d: defaultdict = defaultdict(str)
-    parse_vmx(vmx_file, d)
-    vmx_file.close()
+    d: dict = {}
+    parse_vmx(vmx_name, d)
 
-    displayname: str = d["displayname"]
+    displayname: str = d.get("displayname", "")
     if (displayname):
         log.debug("[DISPLAYNAME] %s", displayname)
-    annotation: str = d["annotation"]
+    annotation: str = d.get("annotation", "")
     if (annotation):
         log.debug("[ANNOTATION] %s", annotation)
-    memory: int = int(d["memsize"] or 1024)
+    memory: int = int(d.get("memsize", "") or 1024)
     if (memory):
         log.debug("[MEMORY] %s", memory)
 
-    genid: str = parse_genid(int(d["vm.genid"] or 0), int(d["vm.genidx"] or 0))
+    genid: str = parse_genid(int(d.get("vm.genid", "") or 0), int(d.get("vm.genidx", "") or 0))
     if (genid):
         log.debug("[GENID] %s", genid)
 
     # SMBIOS.reflectHost = "TRUE"
     # SMBIOS.noOEMStrings = "TRUE"
     # smbios.addHostVendor = "TRUE"
-    sysinfo: str = "host" if (parse_boolean(d["smbios.reflectHost"])) else ""
+    sysinfo: str = "host" if (parse_boolean(d.get("smbios.reflectHost", ""))) else ""
     if (sysinfo):
         log.debug("[SYSINFO] %s", sysinfo)
 
-    vcpus: int = int(d["numvcpus"] or 0)
+    vcpus: int = int(d.get("numvcpus", "") or 0)
     vcpus = max(vcpus, 1)
-    corespersocket: int = int(d["cpuid.corespersocket"] or 0)
+    corespersocket: int = int(d.get("cpuid.corespersocket", "") or 0)
     corespersocket = max(corespersocket, 1)
 
     sockets: int = vcpus // corespersocket
@@ -997,27 +1123,29 @@ def main(argc: int, argv: list) -> int:
     cpu_migratable: str = "on"
     cpu: dict = {"model": cpu_model, "check": cpu_check, "migratable": cpu_migratable}
     iothreads: int = vcpus # XXX forgot the rule of thumb to set this
-    vm_affinity: str = parse_vm_affinity(d["sched.cpu.affinity"])
+    vm_affinity: str = parse_vm_affinity(d.get("sched.cpu.affinity", ""))
 
     uefi: str = ""
-    if (d["firmware"] == "efi"):
+    if (d.get("firmware", "") == "efi"):
         uefi = "uefi"
-        if (vinst_version >= 4.0):
-            if (parse_boolean(d["uefi.secureboot.enabled"])):
+        if (vinst_version >= (4, 0)):
+            if (parse_boolean(d.get("uefi.secureboot.enabled", ""))):
                 uefi += ",firmware.feature0.name=secure-boot,firmware.feature0.enabled=yes"
             else:
                 uefi += ",firmware.feature0.name=secure-boot,firmware.feature0.enabled=no"
 
-    nvram: list = parse_filename_ref(d["nvram"], datastores, (disk_mode != "none"), raw)
+    # the extension of the translated disk references is the same for all of them.
+    to_file_ext: str = img_file_ext(raw)
+    nvram: list = parse_filename_ref(d.get("nvram", ""), datastores, (disk_mode != "none"), to_file_ext)
     if (uefi):
         log.debug("[UEFI] %s", uefi)
 
     # ignore for now
-    # guestos: str = parse_guestos(d["guestos"])
+    # guestos: str = parse_guestos(d.get("guestos", ""))
 
-    svga: bool = parse_boolean(d["svga.present"])
-    svga_memory: int = int(d["svga.vramsize"] or 0) // 1024
-    vga: bool = parse_boolean(d["svga.vgaonly"])
+    svga: bool = parse_boolean(d.get("svga.present", ""))
+    svga_memory: int = int(d.get("svga.vramsize", "") or 0) // 1024
+    vga: bool = parse_boolean(d.get("svga.vgaonly", ""))
     if (vga):
         log.debug("[VGA]")
     elif (svga):
@@ -1027,23 +1155,23 @@ def main(argc: int, argv: list) -> int:
     if (sound):
         log.debug("[SOUND] %s", sound)
 
-    # these interface names are used in vmware for disks
-    disk_ctrls: dict = {"scsi": {}, "sata": {}, "nvme": {}, "ide": {}}
-    disks: list = []
-    for interface in disk_ctrls:
-        disk_ctrls[interface] = find_disk_controllers(d, interface)
-        disks.extend(find_disks(d, datastores, interface, disk_ctrls[interface], disk_mode, raw))
+    (ctrl_attrs, disk_attrs) = index_device_attrs(d)
+    (disk_ctrls, disks) = find_all_disks(ctrl_attrs, disk_attrs, datastores, disk_mode, to_file_ext)
+    if (disk_mode == "convert"):
+        # all disks are known now, inspect them in a single parallel batch.
+        inspect_disks(disks)
 
     floppys: list = [[None, None], [None, None]]
     for i in range(2):
-        floppys[i] = parse_filename_ref(d[f"floppy{i}.filename"], datastores, disk_mode != "none", raw)
+        floppys[i] = parse_filename_ref(d.get(f"floppy{i}.filename", ""), datastores, disk_mode != "none", to_file_ext)
 
-    eths: list = find_eths(d, "ethernet", networks, sandbox)
+    eths: list = find_eths(ctrl_attrs["ethernet"], "ethernet", networks, sandbox)
 
-    log.debug("%s", disk_ctrls)
-    log.debug("%s", disks)
-    log.debug("%s", floppys)
-    log.debug("%s", eths)
+    if (log.isEnabledFor(logging.DEBUG)):
+        log.debug("%s", disk_ctrls)
+        log.debug("%s", disks)
+        log.debug("%s", floppys)
+        log.debug("%s", eths)
 
     # run virt-install to generate the xml
     xml: str = virt_install(vinst_version,
@@ -1060,29 +1188,51 @@ def main(argc: int, argv: list) -> int:
                  eths)
 
     # extract macs from the xml
-    macs: list = re.findall(r"^.*mac address.*(\w\w:\w\w:\w\w:\w\w:\w\w:\w\w).*$", xml, flags=re.MULTILINE)
+    macs: list = mac_address_re.findall(xml)
 
     if (disk_mode == "convert"):
-        for disk in disks:
-            paths: tuple = disk["path"]
-            if (skip_extra and not (disk["os"]["name"])):
-                log.info("convert: skipping extra non-OS disk %s", paths[0])
-                continue
-            convert_path(paths[0], paths[1], disk_mode, raw, conv_mode,
-                         adj_mode, adj_actions, macs, disk["os"],
-                         trace_cmd, cache_mode, numa_node, parallel)
+        # each disk is converted by its own external commands, so run up to parallel_disks of them at once.
+        # a virt-v2v conversion is already heavyweight per disk (its own appliance doing the whole copy),
+        # so running several at once only makes them compete for memory and I/O: convert one at a time.
+        # The shorter virt-v2v-in-place adjust step of -x/-y is fine to overlap with the other copies.
+        workers: int = 1 if (conv_mode == "v2v") else parallel_disks
+        # trace-cmd records on the single global ftrace instance, concurrent sessions would clobber each other.
+        if (trace_cmd):
+            workers = 1
+        failed: threading.Event = threading.Event()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures: list = []
+            for disk in disks:
+                paths: tuple = disk["path"]
+                if (skip_extra and not (disk["os"]["name"])):
+                    log.info("convert: skipping extra non-OS disk %s", paths[0])
+                    continue
+                futures.append(executor.submit(convert_path_unless_failed, failed,
+                                               paths[0], paths[1], disk_mode, raw, conv_mode,
+                                               adj_mode, adj_actions, macs, disk["os"],
+                                               trace_cmd, cache_mode, numa_node, parallel))
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # a conversion failed (or exited), do not start the ones still queued before leaving the pool.
+                for future in futures:
+                    future.cancel()
+                raise
 
     ### WRITE THE RESULTING DOMAIN XML ###
     # we need to do it here for v2v, since it writes a skeleton xml we need to overwrite
     try:
-        xml_file = open(xml_name, 'w', encoding="utf-8") if (xml_name) else sys.stdout
-        xml_file.write(xml)
         if (xml_name):
-            xml_file.close()
-    except:
-        log.critical("failed to write XML file %s", xml_name)
+            with open(xml_name, 'w', encoding="utf-8") as xml_file:
+                xml_file.write(xml)
+        else:
+            sys.stdout.write(xml)
+    except (OSError, ValueError) as e:
+        log.critical("failed to write XML file %s: %s", xml_name, e)
         return 1
     return 0
 
 
-sys.exit(main(len(sys.argv), sys.argv))
+if (__name__ == "__main__"):
+    sys.exit(main(len(sys.argv), sys.argv))
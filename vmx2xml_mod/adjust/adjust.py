@@ -19,19 +19,24 @@
 #
 # Experimental guest adjustment submodule
 
+import re
 import subprocess
+import functools
 
 from vmx2xml_mod.log import log, logging, log_get_vq
 from vmx2xml_mod.runcmd import runcmd_detectv
 
+adjust_guestfs_version_re: re.Pattern = re.compile(r"^(\d+\.\d+)", flags=re.MULTILINE)
+
 
 # in-place adjustment using virt-v2v-in-place, returns True on success.
 def adjust_guestfs_v2v(from_file: str) -> bool:
     args: list = ["virt-v2v-in-place", "--root=first", "-i", "disk"]
 
-    if (log.level > logging.WARNING):
+    lvl: int = log.getEffectiveLevel()
+    if (lvl > logging.WARNING):
         args.append("--quiet")
-    if (log.level <= logging.DEBUG):
+    if (lvl <= logging.DEBUG):
         args.append("-x")
     args.append(from_file)
 
@@ -40,8 +45,32 @@ def adjust_guestfs_v2v(from_file: str) -> bool:
     return (p.returncode == 0)
 
 
+# adjust_guestfs.py is installed next to vmx2xml.py, and importing it lets us run the adjustment
+# in-process, without starting another python interpreter. Returns None if it cannot be imported,
+# for example when the libguestfs python bindings are missing.
+@functools.lru_cache(maxsize=1)
+def adjust_guestfs_py_module():
+    try:
+        import adjust_guestfs as module # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return module
+
+
 # adjust using the experimental adjust_guestfs.py. Returns True on success.
 def adjust_guestfs_py(path: str, nbd: bool, adj_actions: dict, macs: list) -> bool:
+    module = adjust_guestfs_py_module()
+    if (module):
+        log.debug("adjust_guestfs.adjust_guestfs(%s, %s, %s, %s)", path, nbd, adj_actions, macs)
+        # libguestfs reports errors as exceptions: as for a failing adjust_guestfs.py process,
+        # report the failure instead of aborting the conversion, which would leave its NBD servers running.
+        try:
+            return module.adjust_guestfs(path, nbd, adj_actions["drivers"], adj_actions["trim"],
+                                         adj_actions["fstab"], macs if (adj_actions["net"]) else [])
+        except Exception as exp:
+            log.error("adjust_guestfs: %s: %s", path, exp)
+            return False
+
     args: list = ["adjust_guestfs.py", "-n" if (nbd) else "-f", path]
     if (adj_actions["drivers"]):
         args.append("-d")
@@ -87,5 +116,5 @@ def adjust_guestfs(path: str, nbd: bool, adj_mode: str, adj_actions: dict, macs:
     return rv
 
 
-def adjust_guestfs_detect_version() -> float:
-    return runcmd_detectv(["adjust_guestfs.py", "--version"], r"^(\d+\.\d+)", True)
+def adjust_guestfs_detect_version() -> tuple:
+    return runcmd_detectv(["adjust_guestfs.py", "--version"], adjust_guestfs_version_re, True)
@@ -21,17 +21,22 @@
 
 import sys
 import os
-import re
+import json
 import subprocess
 import tempfile
-import glob
+import shutil
 import time
+import fcntl
+import concurrent.futures
 
 from vmx2xml_mod.log import log, logging
 from vmx2xml_mod.numa import numa_restrict_cmd
 from vmx2xml_mod.trace import trace_cmd_start
 from vmx2xml_mod.adjust import adjust_guestfs
-from vmx2xml_mod.runcmd import runcmd
+from vmx2xml_mod.runcmd import runcmd, runcmd_spawn
+
+# the FICLONE ioctl from linux/fs.h, _IOW(0x94, 9, int)
+img_ficlone: int = 0x40049409
 
 
 def img_wait_child(pid: int) -> None:
@@ -45,6 +50,25 @@ def img_file_ext(raw: bool) -> str:
     return "raw" if (raw) else "qcow2"
 
 
+# find the disk generated by virt-v2v, named prefix-sdX.
+def img_v2v_find_output(prefix: str) -> str:
+    # with a single disk in input the generated name is normally prefix-sda, avoid scanning the directory.
+    candidate: str = f"{prefix}-sda"
+    if (os.path.exists(candidate)):
+        return candidate
+    # otherwise there must be exactly one generated disk.
+    dirname: str = os.path.dirname(prefix)
+    start: str = os.path.basename(prefix) + "-sd"
+    srcnames: list = []
+    with os.scandir(dirname or ".") as it:
+        for entry in it:
+            if (entry.name.startswith(start)):
+                srcnames.append(os.path.join(dirname, entry.name))
+    if (len(srcnames) != 1):
+        return ""
+    return srcnames[0]
+
+
 def img_v2v_convert(from_file: str, to_file: str, trace_cmd: bool, numa_node: int, raw: bool) -> None:
     to_file_ext: str = img_file_ext(raw)
     dirname: str = os.path.dirname(to_file)
@@ -56,9 +80,10 @@ def img_v2v_convert(from_file: str, to_file: str, trace_cmd: bool, numa_node: in
         args.extend(numa_restrict_cmd(numa_node))
     args.extend(["virt-v2v", "--root=first", "-i", "disk", "-o", "disk", "-of", to_file_ext, "-os", dirname])
 
-    if (log.level > logging.WARNING):
+    lvl: int = log.getEffectiveLevel()
+    if (lvl > logging.WARNING):
         args.append("--quiet")
-    if (log.level <= logging.DEBUG):
+    if (lvl <= logging.DEBUG):
         args.append("-x")
     args.append(from_file)
 
@@ -75,11 +100,11 @@ def img_v2v_convert(from_file: str, to_file: str, trace_cmd: bool, numa_node: in
         img_wait_child(tpid)
 
     # Now rename to the name we want
-    srcnames: list = glob.glob(to_file[0:-len(f".{to_file_ext}")] + "-sd*")
-    if (len(srcnames) != 1):
+    srcname: str = img_v2v_find_output(to_file[0:-len(f".{to_file_ext}")])
+    if (not srcname):
         log.critical("could not find the generated disk %s", to_file)
         sys.exit(1)
-    os.rename(srcnames[0], to_file)
+    os.rename(srcname, to_file)
 
 
 # there is no annotation for Tempfile, so return type is unknown
@@ -115,6 +140,10 @@ def img_qemu_copy(from_file: str, to_file: str, trace_cmd: bool, cache_mode: str
     args.extend(["qemu-img", "convert", "-O", to_file_ext, "-t", cache_mode, "-T", cache_mode])
     if (parallel > 0):
         args.extend(["-m", str(parallel)])
+    # out of order writes (-W) keep all the coroutines busy, and are what qemu-img recommends for raw
+    # targets. With qcow2 they would fragment the cluster allocation of the image, so only use them for raw.
+    if (raw and parallel > 1):
+        args.append("-W")
     if (log.getEffectiveLevel() <= logging.WARNING):
         args.append("-p")
     args.extend([from_file, to_file])
@@ -127,13 +156,12 @@ def img_qemu_copy(from_file: str, to_file: str, trace_cmd: bool, cache_mode: str
 
 
 def img_qemu_info(from_file: str) -> int:
-    s: str = runcmd(["qemu-img", "info", "-U", from_file], True)
-    # sorry, human output is way easier to parse than the json file.
-    vsize_m = re.search(r"^virtual size:.*\((\d+) bytes\)", s, flags=re.MULTILINE)
-    if (not vsize_m):
+    s: str = runcmd(["qemu-img", "info", "--output=json", "-U", from_file], True)
+    try:
+        return int(json.loads(s)["virtual-size"])
+    except (ValueError, KeyError, TypeError):
         log.critical("qemu-img info output could not be parsed!")
         sys.exit(1)
-    return int(vsize_m.group(1))
 
 
 def img_qemu_convert(sourcepath: str, targetpath: str, adj_mode: str, adj_actions: dict, macs: list,
@@ -159,10 +187,7 @@ def img_qemu_nbd_create(s: str, overlay: bool, cache_mode: str, raw: bool, reado
     if (readonly):
         args.append("-r")
     args.append(s)
-    log.debug("%s", args)
-    pid: int = os.fork()
-    if (pid == 0):
-        os.execvp(args[0], args)
+    pid: int = runcmd_spawn(args)
     args = ["nbdinfo", f"nbd+unix:///?socket={tmp.name}"]
     while True:
         log.debug("%s", args)
@@ -180,8 +205,10 @@ def img_qemu_nbd_copy(sin: str, sout: str, trace_cmd: bool, numa_node: int, para
     if (numa_node >= 0):
         args.extend(numa_restrict_cmd(numa_node))
 
+    # keep at least 16 requests in flight per connection.
+    requests: int = max(64, parallel * 16)
     args.extend(["nbdcopy", f"nbd+unix:///?socket={sin}", f"nbd+unix:///?socket={sout}",
-                 '--requests=64', '--flush', '--progress'])
+                 f'--requests={requests}', '--flush', '--progress'])
     if (parallel > 0):
         args.extend(['-C', str(parallel), '-T', str(parallel)])
     log.debug("%s", args)
@@ -192,14 +219,26 @@ def img_qemu_nbd_copy(sin: str, sout: str, trace_cmd: bool, numa_node: int, para
         img_wait_child(tpid)
 
 
-def img_qemu_nbd_convert(sourcepath: str, targetpath: str, adj_mode: str, adj_actions: dict, macs: list,
-                         trace_cmd: bool, cache_mode: str, numa_node: int, parallel: int, raw: bool) -> None:
-    (sin, pidin) = img_qemu_nbd_create(sourcepath, adj_mode != "none", cache_mode, False, adj_mode == "none")
-    if (adj_mode != "none"):
-        adjust_guestfs(sin.name, True, adj_mode, adj_actions, macs)
+# create the target image sized after the source, and serve it via qemu-nbd.
+def img_qemu_nbd_create_target(sourcepath: str, targetpath: str, cache_mode: str, raw: bool) -> tuple:
     vsize: int = img_qemu_info(sourcepath)
     img_qemu_create(targetpath, vsize, raw)
-    (sout, pidout) = img_qemu_nbd_create(targetpath, False, cache_mode, raw, False)
+    return img_qemu_nbd_create(targetpath, False, cache_mode, raw, False)
+
+
+def img_qemu_nbd_convert(sourcepath: str, targetpath: str, adj_mode: str, adj_actions: dict, macs: list,
+                         trace_cmd: bool, cache_mode: str, numa_node: int, parallel: int, raw: bool) -> None:
+    # the source and target qemu-nbd servers are independent, so start them concurrently,
+    # and run the guest adjustment on the source while the target is being prepared.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        fin = executor.submit(img_qemu_nbd_create, sourcepath, adj_mode != "none", cache_mode, False,
+                              adj_mode == "none")
+        fout = executor.submit(img_qemu_nbd_create_target, sourcepath, targetpath, cache_mode, raw)
+        (sin, pidin) = fin.result()
+        if (adj_mode != "none"):
+            adjust_guestfs(sin.name, True, adj_mode, adj_actions, macs)
+        (sout, pidout) = fout.result()
+
     img_qemu_nbd_copy(sin.name, sout.name, trace_cmd, numa_node, parallel)
     sin.close()
     sout.close()
@@ -207,3 +246,51 @@ def img_qemu_nbd_convert(sourcepath: str, targetpath: str, adj_mode: str, adj_ac
     os.remove(sout.name)
     os.kill(pidin, 15)
     os.kill(pidout, 15)
+
+
+# clone the file data with the FICLONE ioctl, on CoW filesystems (btrfs, xfs). Returns True on success.
+def img_copy_clone(from_file: str, to_file: str) -> bool:
+    try:
+        with open(from_file, "rb") as fin, open(to_file, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), img_ficlone, fin.fileno())
+        shutil.copystat(from_file, to_file)
+    except OSError as err:
+        log.debug("FICLONE failed: %s", err)
+        return False
+    return True
+
+
+# copy in the kernel with copy_file_range (python >= 3.8). Returns True on success.
+def img_copy_file_range(from_file: str, to_file: str) -> bool:
+    if (not hasattr(os, "copy_file_range")):
+        return False
+    try:
+        with open(from_file, "rb") as fin, open(to_file, "wb") as fout:
+            while (os.copy_file_range(fin.fileno(), fout.fileno(), 64 * 1024 * 1024) > 0):
+                pass
+        shutil.copystat(from_file, to_file)
+    except OSError as err:
+        log.info("copy_file_range failed: %s", err)
+        return False
+    return True
+
+
+# copy a file (non-VMDK disk), preserving the modification time.
+def img_copy(from_file: str, to_file: str) -> None:
+    # try to clone the data ourselves first, which makes the copy almost free and needs no process.
+    if (img_copy_clone(from_file, to_file)):
+        return
+    # cp --reflink=auto also falls back to copy_file_range and sparse copies.
+    args: list = ["cp", "--reflink=auto", "--preserve=mode,timestamps", from_file, to_file]
+    log.debug("%s", args)
+    try:
+        p = subprocess.run(args, check=False)
+        if (p.returncode == 0):
+            return
+    except OSError:
+        pass
+    log.info("cp failed, falling back to a copy from python")
+    if (img_copy_file_range(from_file, to_file)):
+        return
+    # use copy2 so we try to preserve modification time.
+    shutil.copy2(from_file, to_file)
@@ -19,29 +19,92 @@
 #
 # virt-inspector call to get os info on the image
 
+import os
 import re
+import functools
 
 from vmx2xml_mod.log import log
 from vmx2xml_mod.runcmd import runcmd, runcmd_detectv
 
-def inspector_inspect(path: str) -> dict:
-    s: str = runcmd(["virt-inspector", "--no-icon", "--no-applications", "--echo-keys", path], False)
-    osd: dict = {"name": '', "osinfo": ''}
+inspector_version_re: re.Pattern = re.compile(r" (\d+\.\d+)", flags=re.MULTILINE)
+inspector_name_re: re.Pattern = re.compile(r"^\s*<name>(.+)</name>\s*$", flags=re.MULTILINE)
+inspector_osinfo_re: re.Pattern = re.compile(r"\s*<osinfo>(.+)</osinfo>\s*$", flags=re.MULTILINE)
+
+# the libguestfs python bindings, or None if they are not installed or too old.
+@functools.lru_cache(maxsize=1)
+def inspector_guestfs_module():
+    try:
+        import guestfs # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    # inspect_get_osinfo was added in libguestfs 1.38
+    if (not hasattr(guestfs.GuestFS, "inspect_get_osinfo")):
+        log.info("libguestfs bindings without inspect_get_osinfo, using virt-inspector")
+        return None
+    return guestfs
+
+
+# inspect in-process with the libguestfs bindings, getting the same name and osinfo that
+# virt-inspector reports for the first root. Returns None if the bindings are not usable.
+def inspector_inspect_guestfs(path: str):
+    guestfs = inspector_guestfs_module()
+    if (not guestfs):
+        return None
+    try:
+        g = guestfs.GuestFS(python_return_dict=True)
+        try:
+            g.add_drive_opts(path, readonly=1)
+            g.launch()
+            roots: list = g.inspect_os()
+            if (not roots):
+                return ('', '')
+            return (g.inspect_get_type(roots[0]), g.inspect_get_osinfo(roots[0]))
+        finally:
+            g.close()
+    except RuntimeError as err:
+        log.info("%s: libguestfs inspection failed, trying virt-inspector: %s", path, err)
+        return None
+
 
+# virt-inspector needs to launch the libguestfs appliance, which takes seconds,
+# so only inspect each image once, even if referenced multiple times.
+# Returns an immutable (name, osinfo) tuple, so the cached result cannot be modified by callers.
+# size and mtime are part of the key, so an image rewritten in the meantime is inspected again.
+@functools.lru_cache(maxsize=None)
+def inspector_inspect_realpath(path: str, _size: int, _mtime: int) -> tuple:
+    osd = inspector_inspect_guestfs(path)
+    if (osd):
+        log.debug("[OS DATA] %s %s", osd[0], osd[1])
+        return osd
+    s: str = runcmd(["virt-inspector", "--no-icon", "--no-applications", "--echo-keys", path], False)
     if (not s):
         log.error("%s could not be inspected.", path)
-        return osd
+        return ('', '')
 
-    name_m = re.search(r"^\s*<name>(.+)</name>\s*$", s, flags=re.MULTILINE)
-    osinfo_m = re.search(r"\s*<osinfo>(.+)</osinfo>\s*$", s, flags=re.MULTILINE)
-    if (name_m):
-        osd["name"] = name_m.group(1)
-    if (osinfo_m):
-        osd["osinfo"] = osinfo_m.group(1)
+    name_m = inspector_name_re.search(s)
+    osinfo_m = inspector_osinfo_re.search(s)
+    name: str = name_m.group(1) if (name_m) else ''
+    osinfo: str = osinfo_m.group(1) if (osinfo_m) else ''
 
-    log.debug("[OS DATA] %s %s", osd["name"], osd["osinfo"])
-    return osd
+    log.debug("[OS DATA] %s %s", name, osinfo)
+    return (name, osinfo)
+
+
+def inspector_inspect(path: str) -> dict:
+    path = os.path.realpath(path)
+    size: int = 0
+    mtime: int = 0
+    try:
+        st: os.stat_result = os.stat(path)
+        (size, mtime) = (st.st_size, int(st.st_mtime))
+        if (size == 0):
+            # empty pseudo disk, nothing to inspect
+            return {"name": '', "osinfo": ''}
+    except OSError:
+        pass
+    (name, osinfo) = inspector_inspect_realpath(path, size, mtime)
+    return {"name": name, "osinfo": osinfo}
 
 
-def inspector_detect_version() -> float:
-    return runcmd_detectv(["virt-inspector", "--version"], r" (\d+\.\d+)", True)
+def inspector_detect_version() -> tuple:
+    return runcmd_detectv(["virt-inspector", "--version"], inspector_version_re, True)
@@ -42,6 +42,8 @@ def log_init(verbose: int, quiet: int) -> None:
     quiet = min(quiet, 2)
     loglevel: int = logging.WARNING - (verbose * 10) + (quiet * 10)
     log.setLevel(loglevel)
+    if (log.handlers):
+        return                  # already initialized, only update the level
     handler = logging.StreamHandler()
     handler.setFormatter(logging.Formatter(fmt='%(levelname)-8s| %(message)s'))
     log.addHandler(handler)
@@ -51,9 +53,10 @@ def log_init(verbose: int, quiet: int) -> None:
 def log_get_vq() -> tuple:
     global log
     v: int = 0; q: int = 0
+    lvl: int = log.getEffectiveLevel()
 
-    if (log.level < logging.WARNING):
-        v = (logging.WARNING - log.level) // 10
-    if (log.level > logging.WARNING):
-        q = (log.level - logging.WARNING) // 10
+    if (lvl < logging.WARNING):
+        v = (logging.WARNING - lvl) // 10
+    if (lvl > logging.WARNING):
+        q = (lvl - logging.WARNING) // 10
     return (v, q)
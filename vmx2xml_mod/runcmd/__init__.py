@@ -1 +1 @@
-from .runcmd import runcmd_detectv, runcmd
+from .runcmd import runcmd_detectv, runcmd, runcmd_spawn
@@ -20,35 +20,118 @@
 # Command execution and version detection submodule
 
 import sys
+import os
 import re
 import subprocess
+import shutil
+import hashlib
+import json
+import functools
+import threading
 
 from vmx2xml_mod.log import log
 
+runcmd_space_re: re.Pattern = re.compile(r"\s")
 
-def detectv_failed(arg: str, check: bool, e: str) -> float:
+
+def detectv_failed(arg: str, check: bool, e: str) -> tuple:
     if (check):
         log.critical("%s: failed to %s", arg, e)
         sys.exit(1)
     log.warning("%s: failed to %s", arg, e)
-    return 0
+    return ()
+
+
+runcmd_versions_lock: threading.Lock = threading.Lock()
+
+
+def runcmd_versions_path() -> str:
+    cache_home: str = os.environ.get("XDG_CACHE_HOME", "")
+    if (not os.path.isabs(cache_home)):
+        # the XDG spec says to ignore relative paths
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "vmx2xml", "versions.json")
+
+
+# the detected versions, loaded once from the cache file. Only access with runcmd_versions_lock held.
+@functools.lru_cache(maxsize=1)
+def runcmd_versions() -> dict:
+    try:
+        with open(runcmd_versions_path(), 'r', encoding="utf-8") as f:
+            versions = json.load(f)
+        if (isinstance(versions, dict)):
+            return versions
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+# a tool version only changes when the executable is replaced, so key the cache on its stat data.
+def runcmd_versions_key(path: str, args: list, r: re.Pattern) -> str:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    key: str = f"{path}|{st.st_dev}|{st.st_ino}|{st.st_mtime_ns}|{st.st_size}|{args}|{r.pattern}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# write back the cache, failing to do so is not an error.
+def runcmd_versions_store(key: str, v: tuple) -> None:
+    path: str = runcmd_versions_path()
+    tmp: str = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    with runcmd_versions_lock:
+        versions: dict = runcmd_versions()
+        versions[key] = v
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w', encoding="utf-8") as f:
+                json.dump(versions, f)
+            os.replace(tmp, path)
+        except OSError as exp:
+            log.debug("could not write version cache %s: %s", path, exp)
 
 
-def runcmd_detectv(args: list, r: str, check: bool) -> float:
+# detect the version of a command, using the compiled pattern r to match the version in its output.
+# The version is returned as a tuple of ints, eg. (2, 10) for "2.10", so that it compares correctly.
+def runcmd_detectv(args: list, r: re.Pattern, check: bool) -> tuple:
     s: str = ""
+    v: tuple
+    # a missing tool is detected with a PATH lookup, without spawning anything.
+    path: str = shutil.which(args[0]) or ""
+    if (not path):
+        return detectv_failed(args[0], check, "find command in PATH")
+    key: str = runcmd_versions_key(path, args, r)
+    if (key):
+        with runcmd_versions_lock:
+            v_cached = runcmd_versions().get(key)
+        if (isinstance(v_cached, list) and v_cached):
+            v = tuple(v_cached)
+            log.info("%s: detected version %s", args[0], ".".join(map(str, v)))
+            return v
     log.debug("%s", args)
     try:
-        p = subprocess.Popen(args, stdout=subprocess.PIPE, encoding='utf-8')
+        # only the version string on stdout is of interest. A version query should be instant,
+        # do not let a hung tool hang the whole conversion.
+        p = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8', check=False,
+                           timeout=5)
+    except subprocess.TimeoutExpired:
+        return detectv_failed(args[0], check, "report version in time")
     except:
         return detectv_failed(args[0], check, "run")
-    (s, _) = p.communicate()
-    m = re.search(r, s, flags=re.MULTILINE)
+    s = p.stdout
+    m = r.search(s)
     if not (m):
         return detectv_failed(args[0], check, "detect version")
-    v: float = float(m.group(1)) or 0
-    if (v == 0):
+    try:
+        v = tuple(int(n) for n in m.group(1).split("."))
+    except ValueError:
+        v = ()
+    if not (any(v)):
         return detectv_failed(args[0], check, "parse version")
-    log.info("%s: detected version %s", args[0], v)
+    log.info("%s: detected version %s", args[0], ".".join(map(str, v)))
+    if (key):
+        runcmd_versions_store(key, v)
     return v
 
 
@@ -56,17 +139,29 @@ def runcmd(args: list, check: bool) -> str:
     exp_str: str
     log.debug("%s", args)
     try:
-        p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')
+        p = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', check=False)
     except Exception as exp:
-        exp_str = re.sub(r"\s", " ", str(exp), count=0, flags=0)
+        exp_str = runcmd_space_re.sub(" ", str(exp))
         log.critical("%s: exception running command %s: %s", args[0], args, exp_str)
         sys.exit(1)
-    (s, e) = p.communicate()
+    (s, e) = (p.stdout, p.stderr)
     if (p.returncode != 0):
-        exp_str = re.sub(r"\s", " ", e, count=0, flags=0)
+        exp_str = runcmd_space_re.sub(" ", e)
         if (check):
             log.critical("%s: failure detected in command %s: %s", args[0], args, exp_str)
             sys.exit(1)
         log.warning("%s: failure detected in command %s: %s", args[0], args, exp_str)
         return ""
     return s
+
+
+# start a command in the background and return its pid.
+# posix_spawnp avoids duplicating the page tables of this process, but needs python >= 3.8.
+def runcmd_spawn(args: list) -> int:
+    log.debug("%s", args)
+    if (hasattr(os, "posix_spawnp")):
+        return os.posix_spawnp(args[0], args, os.environ)
+    pid: int = os.fork()
+    if (pid == 0):
+        os.execvp(args[0], args)
+    return pid
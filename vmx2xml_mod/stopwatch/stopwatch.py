@@ -17,17 +17,16 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 #
-# trivial stopwatch
+# trivial stopwatch, one per thread
 
 import time
-stopwatch_counter: float = 0.0
+import threading
+stopwatch_local: threading.local = threading.local()
 
 
 def stopwatch_start() -> None:
-    global stopwatch_counter
-    stopwatch_counter = time.perf_counter()
+    stopwatch_local.counter = time.perf_counter()
 
 
 def stopwatch_elapsed() -> float:
-    global stopwatch_counter
-    return time.perf_counter() - stopwatch_counter
+    return time.perf_counter() - getattr(stopwatch_local, "counter", 0.0)
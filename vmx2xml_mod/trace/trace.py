@@ -20,12 +20,15 @@
 # Tracing submodule
 
 import sys
-import os
+import re
 import tempfile
 
 from vmx2xml_mod.log import log, logging
 from vmx2xml_mod.numa import *
-from vmx2xml_mod.runcmd import runcmd_detectv
+from vmx2xml_mod.runcmd import runcmd_detectv, runcmd_spawn
+
+trace_cmd_version_re: re.Pattern = re.compile(r"^.*version (\d+\.\d+)", flags=re.MULTILINE)
+
 
 def trace_cmd_start(pre: str, numa_node: int) -> int:
     args: list = []
@@ -36,17 +39,12 @@ def trace_cmd_start(pre: str, numa_node: int) -> int:
     args.extend(["trace-cmd", "record", "-o", tmp.name, "-e", "sched", "-e", "syscalls", "-e", "irq"])
     if (log.level > logging.DEBUG):
         args.append("-q")
-    log.debug("%s", args)
-
-    pid: int = os.fork()
-    if (pid == 0):
-        os.execvp(args[0], args)
-    return pid
+    return runcmd_spawn(args)
 
 
-def trace_cmd_detect_version() -> float:
-    v: float = runcmd_detectv(["trace-cmd", "-h"], r"^.*version (\d+\.\d+)", True)
-    if (v < 2.7):
+def trace_cmd_detect_version() -> tuple:
+    v: tuple = runcmd_detectv(["trace-cmd", "-h"], trace_cmd_version_re, True)
+    if (v < (2, 7)):
         log.critical("trace-cmd >= 2.7 required")
         sys.exit(1)
     return v